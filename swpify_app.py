@@ -3,11 +3,26 @@
 # Requires: streamlit==1.38.0, spotipy==2.23.0, pandas
 
 import datetime as dt
+import html
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Deque, List, Dict, Optional, Tuple, TypeVar
 
+import requests
 import streamlit as st
+import urllib3
 import spotipy
+from spotipy.cache_handler import MemoryCacheHandler
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyOAuth
 
 
@@ -42,7 +57,7 @@ st.markdown(MOBILE_CSS, unsafe_allow_html=True)
 # --------------------------- Helpers & State --------------------------- #
 @dataclass(frozen=True)
 class K:
-    queue    : str = "queue"          # list[dict] of track payloads
+    queue    : str = "queue"          # deque[dict] of track payloads
     swiped   : str = "swiped_today"   # int
     favourites: str = "favourites_playlist"  # str
     total    : str = "total_liked"    # int (all liked tracks in library)
@@ -51,11 +66,22 @@ class K:
     added_before: str = "added_filter_end"    # str
     token_info: str = "token_info"    # dict from SpotifyOAuth
     seen_ids : str = "seen_ids"       # set of track ids already swiped this session
+    user_id  : str = "user_id"        # str, Spotify id of the logged-in user
+    queue_pos: str = "queue_pos"      # int, cards consumed from the saved queue
+    restored : str = "restored"       # bool, saved progress already checked this session
+    client   : str = "sp_client"      # (access_token, spotipy.Spotify) reused across reruns
+    refresh  : str = "token_refresh"  # Future of a token refresh running in the background
+    pending  : str = "pending_writes" # {"fav": {playlist: [ids]}, "unlike": [ids]} not yet sent
+    last_flush: str = "last_flush"    # float, time.time() of the last sync to Spotify
+    last_save: str = "last_save"      # float, time.time() progress was last written to disk
+    playlists: str = "playlist_ids"   # {name: playlist id} resolved for this user
+    playlists_ok: str = "playlists_checked"  # set of names whose saved id was re-checked this session
+    library  : str = "library"        # {"total": int, "items": [payload]} from the last build
 
 
 def init_state():
     if K.queue not in st.session_state:
-        st.session_state[K.queue] = []
+        st.session_state[K.queue] = deque()
     if K.swiped not in st.session_state:
         st.session_state[K.swiped] = 0
     if K.favourites not in st.session_state:
@@ -64,12 +90,19 @@ def init_state():
         st.session_state[K.total] = 0
     if K.seen_ids not in st.session_state:
         st.session_state[K.seen_ids] = set()
+    if K.queue_pos not in st.session_state:
+        st.session_state[K.queue_pos] = 0
+    if K.pending not in st.session_state:
+        st.session_state[K.pending] = {"fav": {}, "unlike": []}
+    if K.last_flush not in st.session_state:
+        st.session_state[K.last_flush] = 0.0
+    if K.last_save not in st.session_state:
+        st.session_state[K.last_save] = 0.0
     # Make COMPACT the default (mobile-first).
     # Allow override with ?compact=0 | 1
-    qp_val = str(st.query_params.get("compact", "1")).lower()
-    default_compact = not (qp_val in ("0", "false"))
     if K.compact not in st.session_state:
-        st.session_state[K.compact] = default_compact
+        qp_val = str(st.query_params.get("compact", "1")).lower()
+        st.session_state[K.compact] = not (qp_val in ("0", "false"))
     if K.added_after not in st.session_state:
         st.session_state[K.added_after] = "2020/01/01"
     if K.added_before not in st.session_state:
@@ -89,25 +122,178 @@ def parse_date(s: str) -> Optional[dt.date]:
 
 
 def fmt_ms(ms: int) -> str:
-    sec = int(round(ms / 1000))
-    m = sec // 60
-    s = sec % 60
+    m, s = divmod(int(round(ms / 1000)), 60)
     return f"{m}:{s:02d}"
 
 
+# Per-user progress on disk, so a browser refresh or worker restart resumes
+# without rebuilding. The queue (large) is written once per build; what
+# changes per swipe (head position + seen ids) goes to a second file, saved
+# at sync cadence rather than on every swipe since `seen` grows with the library.
+STATE_DIR = Path(__file__).resolve().parent
+
+
+def _state_path(user_id: str, kind: str) -> Path:
+    safe = "".join(c for c in user_id if c.isalnum() or c in "-_")
+    return STATE_DIR / f".swpify_{kind}_{safe}.json"
+
+
+def _write_json(path: Path, data) -> None:
+    # Write-then-rename: a crash mid-write never leaves a truncated file. The
+    # temp name is unique so two tabs of one user can't rename each other's.
+    # Saving is best effort, like the reads: a disk hiccup must not break swiping.
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=STATE_DIR, prefix=f"{path.stem}.", suffix=".tmp", delete=False
+        ) as tmp:
+            tmp_name = tmp.name
+            json.dump(data, tmp, separators=(",", ":"))
+        os.replace(tmp_name, path)
+    except OSError:
+        if tmp_name and os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+def save_progress(user_id: str):
+    st.session_state[K.last_save] = time.time()
+    _write_json(_state_path(user_id, "progress"), {
+        "pos": st.session_state[K.queue_pos],
+        "seen": list(st.session_state[K.seen_ids]),
+        "total": st.session_state[K.total],
+        "pending": st.session_state[K.pending],
+    })
+
+
+def save_queue(user_id: str):
+    _write_json(_state_path(user_id, "queue"), list(st.session_state[K.queue]))
+    save_progress(user_id)
+
+
+def playlist_ids(user_id: str) -> Dict[str, str]:
+    # loaded once per session; saved whenever a new name is resolved
+    if K.playlists not in st.session_state:
+        try:
+            ids = json.loads(_state_path(user_id, "playlists").read_text("utf-8"))
+        except (OSError, ValueError):
+            ids = {}
+        st.session_state[K.playlists] = ids
+    return st.session_state[K.playlists]
+
+
+def save_playlist_id(user_id: str, name: str, pid: str):
+    ids = playlist_ids(user_id)
+    ids[name] = pid
+    _write_json(_state_path(user_id, "playlists"), ids)
+
+
+def forget_playlist_id(user_id: str, name: str):
+    ids = playlist_ids(user_id)
+    if ids.pop(name, None) is not None:
+        _write_json(_state_path(user_id, "playlists"), ids)
+
+
+def swap_library_fingerprint(user_id: str, fingerprint: Tuple[int, Optional[str]]) -> Optional[Tuple]:
+    # The fingerprint the last build cached the library under, replaced by
+    # this one. Kept on disk so a restart can still clear the old entry.
+    path = _state_path(user_id, "library")
+    try:
+        prev = tuple(json.loads(path.read_text("utf-8")))
+    except (OSError, ValueError, TypeError):
+        prev = None
+    if prev != fingerprint:
+        _write_json(path, list(fingerprint))
+    return prev
+
+
+def restore_state(user_id: str) -> bool:
+    try:
+        queue = json.loads(_state_path(user_id, "queue").read_text("utf-8"))
+        progress = json.loads(_state_path(user_id, "progress").read_text("utf-8"))
+    except (OSError, ValueError):
+        return False
+    pos = progress.get("pos", 0)
+    st.session_state[K.queue] = deque(queue[pos:])
+    st.session_state[K.queue_pos] = pos
+    st.session_state[K.seen_ids] = set(progress.get("seen", []))
+    st.session_state[K.total] = progress.get("total", 0)
+    st.session_state[K.pending] = progress.get("pending", {"fav": {}, "unlike": []})
+    return True
+
+
 def make_oauth() -> SpotifyOAuth:
     return SpotifyOAuth(
         client_id=st.secrets["SPOTIPY_CLIENT_ID"],
         client_secret=st.secrets["SPOTIPY_CLIENT_SECRET"],
         redirect_uri=st.secrets["SPOTIPY_REDIRECT_URI"],
         scope="user-library-read user-library-modify playlist-modify-private playlist-modify-public",
-        cache_path=None,
+        # Token lives in this session only. Without a handler spotipy falls back
+        # to a shared ./.cache file: disk IO on every exchange, and one user's
+        # token would be handed to the next visitor.
+        cache_handler=MemoryCacheHandler(token_info=st.session_state.get(K.token_info)),
         show_dialog=False,
     )
 
 
-def token_to_client() -> Optional[spotipy.Spotify]:
-    oauth = make_oauth()
+REFRESH_AHEAD = 300  # seconds of token life left when a background refresh starts
+
+
+class TokenRefresher:
+    """Runs token refreshes on worker threads, one in flight per refresh token.
+
+    Reruns, callbacks and tabs that land near expiry together share a single
+    OAuth round trip instead of each starting one.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, oauth: SpotifyOAuth, refresh_token: str) -> Future:
+        with self._lock:
+            fut = self._inflight.get(refresh_token)
+            if fut is not None:
+                return fut
+            fut = self._inflight[refresh_token] = self._pool.submit(oauth.refresh_access_token, refresh_token)
+        # outside the lock: an already-finished future runs this immediately
+        fut.add_done_callback(lambda f: self._forget(refresh_token, f))
+        return fut
+
+    def _forget(self, refresh_token: str, fut: Future):
+        with self._lock:
+            if self._inflight.get(refresh_token) is fut:
+                del self._inflight[refresh_token]
+
+
+@st.cache_resource(show_spinner=False)
+def token_refresher() -> TokenRefresher:
+    # one per process, so sessions sharing a refresh token share its refresh
+    return TokenRefresher()
+
+
+def http_session() -> requests.Session:
+    """A session whose transport retries server errors only.
+
+    A 429 must reach sp_call() with its Retry-After. urllib3 retries any 429
+    carrying that header (always, for Spotify) unless told not to, sleeping
+    the full wait itself, and spotipy then reports a header-less "Max
+    Retries" 429, so the shared limiter never learns how long to pause.
+    """
+    retry = urllib3.Retry(
+        total=5, read=False, status=3, backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST", "PUT", "DELETE"}),
+        respect_retry_after_header=False,
+    )
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def token_to_client(oauth: SpotifyOAuth) -> Optional[spotipy.Spotify]:
     token_info = st.session_state.get(K.token_info)
 
     if not token_info:
@@ -121,69 +307,435 @@ def token_to_client() -> Optional[spotipy.Spotify]:
         else:
             return None
 
-    # refresh if expired
-    if oauth.is_token_expired(token_info):
-        token_info = oauth.refresh_access_token(token_info["refresh_token"])
+    # Refresh ahead of expiry on a worker thread so no click waits on the
+    # OAuth round trip. The worker never touches session state; the result is
+    # adopted here on a later run (waiting only if the token is about to lapse).
+    pending = st.session_state.get(K.refresh)
+    if pending is not None and (pending.done() or oauth.is_token_expired(token_info)):
+        st.session_state.pop(K.refresh)
+        token_info = pending.result()
+        st.session_state[K.token_info] = token_info
+    elif oauth.is_token_expired(token_info):
+        token_info = token_refresher().submit(oauth, token_info["refresh_token"]).result()
         st.session_state[K.token_info] = token_info
+    elif pending is None and token_info["expires_at"] - time.time() < REFRESH_AHEAD:
+        st.session_state[K.refresh] = token_refresher().submit(oauth, token_info["refresh_token"])
+
+    # Reuse the client, and with it the keep-alive HTTP session, until the
+    # token changes; a fresh client per rerun paid a new TLS handshake.
+    token = token_info["access_token"]
+    cached = st.session_state.get(K.client)
+    if cached and cached[0] == token:
+        return cached[1]
+    sp = spotipy.Spotify(auth=token, requests_session=http_session())
+    st.session_state[K.client] = (token, sp)
+    return sp
 
-    return spotipy.Spotify(auth=token_info["access_token"])
+
+def spotify() -> Optional[spotipy.Spotify]:
+    # Fragment reruns and button callbacks don't pass through main(), so they
+    # fetch the client here rather than holding one bound at render time,
+    # which would keep using a token after it expired.
+    return token_to_client(make_oauth())
 
 
 # --------------------------- Spotify Actions --------------------------- #
+PAGE_SIZE = 50       # Spotify's max page size for saved tracks / playlists
+FETCH_WORKERS = 8    # concurrent page requests; the shared limiter caps the rate
+MAX_ATTEMPTS = 5     # per call, when Spotify answers 429 Too Many Requests
+MAX_PAUSE = 30.0     # longest Retry-After waited out; the pause holds every session
+RATE_LIMIT = 10      # requests/second sustained across all sessions
+RATE_BURST = 20      # requests that may go out back to back after a quiet spell
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """Token bucket: holds up to `burst` tokens, refilled at `rate` per second.
+
+    A page fan-out after an idle period goes out at once, while a long run of
+    calls settles at `rate`, below Spotify's rolling-window ceiling. pause()
+    holds every caller for a while, e.g. for a 429's Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._resume = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        with self._lock:
+            resume = time.monotonic() + seconds
+            if resume > self._resume:
+                # start refilling from empty, so the pause doesn't end in a burst
+                self._resume = self._stamp = resume
+                self._tokens = 0.0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._resume:
+                    wait = self._resume - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                    self._stamp = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+@st.cache_resource(show_spinner=False)
+def rate_limiter() -> RateLimiter:
+    # one limiter per process: the app's request budget is shared by every session
+    return RateLimiter(RATE_LIMIT, RATE_BURST)
+
+
+# resolved here, on the script thread, so pool workers can use it directly
+LIMITER = rate_limiter()
+
+
+def sp_call(fn: Callable[[], T]) -> T:
+    """Run a Spotify call under the shared rate limit, retrying 429s with
+    jittered exponential backoff.
+
+    The HTTP session only retries 5xx (see http_session), so every 429
+    lands here on its first occurrence, Retry-After included.
+    Retry-After (possibly fractional) wins when present, otherwise the wait
+    doubles up to 16s with +/-50% jitter so parallel workers and other tabs
+    don't all retry at the same instant. The wait pauses the shared limiter,
+    so every other caller holds off too instead of collecting its own 429.
+    A Retry-After beyond MAX_PAUSE isn't waited out: the 429 is raised.
+    """
+    delay = 1.0
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        LIMITER.acquire()
+        try:
+            return fn()
+        except SpotifyException as e:
+            if e.http_status != 429 or attempt == MAX_ATTEMPTS:
+                raise
+            headers = {k.lower(): v for k, v in (e.headers or {}).items()}
+            try:
+                wait = float(headers["retry-after"])
+            except (KeyError, ValueError):
+                wait = random.uniform(delay * 0.5, delay * 1.5)
+            if wait > MAX_PAUSE:
+                raise
+            LIMITER.pause(wait)  # the retry's acquire() then waits it out
+            delay = min(delay * 2, 16)
+
+
+COVER_MIN_PX = 300  # the card shows artwork at 260-420px
+
+
+def _cover_url(images: List[Dict]) -> Optional[str]:
+    # Spotify lists 640/300/64px renditions. The 64px thumbnail is blurry on
+    # the card and 640px is ~4x the bytes, so take the smallest that's big
+    # enough; without sizes, the first (largest) is the safe pick.
+    sized = [i for i in images if (i.get("height") or 0) >= COVER_MIN_PX]
+    if sized:
+        return min(sized, key=lambda i: i["height"])["url"]
+    return images[0]["url"] if images else None
+
+
+def _track_payload(it: Dict) -> Optional[Dict]:
+    t = it["track"]
+    if not t:
+        return None
+    album_images = t["album"]["images"] or []
+    image_url = _cover_url(album_images)
+    return {
+        "id": t["id"],
+        "name": t["name"],
+        "artist": ", ".join(a["name"] for a in t["artists"]),
+        "album": t["album"]["name"],
+        "duration_ms": t.get("duration_ms", 0),
+        "popularity": t.get("popularity", 0),
+        "image": image_url,
+        "url": t["external_urls"]["spotify"],
+        "added_at": it.get("added_at"),
+    }
+
+
+def fetch_pages(page: Callable[[int], Dict]) -> List[Dict]:
+    """Every page of an offset-paged endpoint, in offset order.
+
+    The first page tells us `total`, so the remaining offsets are known up
+    front and fetched concurrently instead of following `next` links.
+    """
+    first = sp_call(lambda: page(0))
+    pages = [first]
+    offsets = range(PAGE_SIZE, first["total"], PAGE_SIZE)
+    if offsets:
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            pages += pool.map(lambda o: sp_call(lambda: page(o)), offsets)
+    return pages
+
+
 def fetch_all_liked(sp: spotipy.Spotify) -> List[Dict]:
     """Get ALL liked tracks with added_at."""
-    items: List[Dict] = []
-    limit = 50
-    offset = 0
-    while True:
-        resp = sp.current_user_saved_tracks(limit=limit, offset=offset)
+    # Pages are fetched concurrently, so a like/unlike mid-fetch can shift
+    # offsets and repeat a track across two pages; keep its first occurrence.
+    items: Dict[str, Dict] = {}
+    for resp in fetch_pages(lambda o: sp.current_user_saved_tracks(limit=PAGE_SIZE, offset=o)):
         for it in resp["items"]:
-            t = it["track"]
-            if not t:
-                continue
-            album_images = t["album"]["images"] or []
-            image_url = album_images[-1]["url"] if album_images else None
-            items.append({
-                "id": t["id"],
-                "name": t["name"],
-                "artist": ", ".join(a["name"] for a in t["artists"]),
-                "album": t["album"]["name"],
-                "duration_ms": t.get("duration_ms", 0),
-                "popularity": t.get("popularity", 0),
-                "image": image_url,
-                "url": t["external_urls"]["spotify"],
-                "added_at": it.get("added_at"),
-            })
-        offset += len(resp["items"])
-        if not resp["next"]:
-            break
-    # store total size for progress (100% = all-time liked size)
-    st.session_state[K.total] = len(items)
-    return items
+            payload = _track_payload(it)
+            if payload:
+                items.setdefault(payload["id"], payload)
+    return list(items.values())
+
+
+INCREMENTAL_PAGES = 4  # past this many new pages a parallel full fetch is quicker
+
+
+def fetch_new_liked(sp: spotipy.Spotify, known: Dict, total: int) -> Optional[List[Dict]]:
+    """`known` (an earlier fetch) brought up to date by paging only the head.
+
+    Saved tracks come newest first, so paging stops at the first track we
+    already have with the same added_at (a re-like moves a track to the head
+    with a new one). Returns None when that doesn't account for `total`, i.e.
+    something was removed outside the app, or the new head runs long; the
+    caller then fetches everything.
+    """
+    known_by_id = {t["id"]: t for t in known["items"]}
+    fresh: Dict[str, Dict] = {}
+    added = 0  # raw items new to the library, unavailable tracks included
+    for offset in range(0, min(total, INCREMENTAL_PAGES * PAGE_SIZE), PAGE_SIZE):
+        resp = sp_call(lambda: sp.current_user_saved_tracks(limit=PAGE_SIZE, offset=offset))
+        for it in resp["items"]:
+            payload = _track_payload(it)
+            old = known_by_id.get(payload["id"]) if payload else None
+            if old and old["added_at"] == payload["added_at"]:
+                if known["total"] + added != total:
+                    return None
+                return list(fresh.values()) + [t for t in known["items"] if t["id"] not in fresh]
+            if not old:
+                added += 1
+            if payload:
+                fresh.setdefault(payload["id"], payload)
+    return None
+
+
+def me_id(sp: spotipy.Spotify) -> str:
+    # immutable for the session, so only ask Spotify once
+    if K.user_id not in st.session_state:
+        st.session_state[K.user_id] = sp_call(sp.current_user)["id"]
+    return st.session_state[K.user_id]
+
+
+def library_fingerprint(sp: spotipy.Spotify) -> Tuple[int, Optional[str]]:
+    """(size, newest added_at) from a single 1-item page.
+
+    Size alone misses a like + unlike pair; the newest added_at catches it.
+    Not cached: it runs once per build and is what notices changes made in
+    Spotify itself, so a cached answer would hide them from the new queue.
+    """
+    resp = sp_call(lambda: sp.current_user_saved_tracks(limit=1))
+    head = resp["items"][0].get("added_at") if resp["items"] else None
+    return resp["total"], head
+
+
+@st.cache_data(persist="disk", max_entries=64, show_spinner="Loading your Liked Songs…")
+def cached_liked(
+    user_id: str, fingerprint: Tuple[int, Optional[str]], _sp: spotipy.Spotify, _known: Optional[Dict] = None
+) -> List[Dict]:
+    """fetch_all_liked memoised per user; a changed library is a new key.
+
+    Persisted to disk so a worker restart doesn't re-page the library.
+    Disk caches ignore ttl, and max_entries only bounds the in-memory copy,
+    so the build clears the superseded key (swap_library_fingerprint).
+    With `_known` (this session's last build) a changed library is topped
+    up from its newest pages rather than re-paged in full.
+    """
+    if _known:
+        items = fetch_new_liked(_sp, _known, fingerprint[0])
+        if items is not None:
+            return items
+    return fetch_all_liked(_sp)
+
+
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def find_playlist_id(user_id: str, name: str, _sp: spotipy.Spotify) -> Optional[str]:
+    def page(offset: int) -> Dict:
+        return sp_call(lambda: _sp.current_user_playlists(limit=PAGE_SIZE, offset=offset))
+
+    def match(resp: Dict) -> Optional[str]:
+        return next((pl["id"] for pl in resp["items"] if pl and pl["name"] == name), None)
+
+    # usually found on the first page; only fan out when it isn't
+    first = page(0)
+    pid = match(first)
+    offsets = range(PAGE_SIZE, first["total"], PAGE_SIZE)
+    if pid or not offsets:
+        return pid
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        futures = [pool.submit(page, o) for o in offsets]
+        for fut in futures:   # offset order, so the first match wins as before
+            pid = match(fut.result())
+            if pid:
+                for rest in futures:
+                    rest.cancel()
+                return pid
+    return None
 
 
 def ensure_playlist(sp: spotipy.Spotify, name: str) -> str:
-    me = sp.current_user()["id"]
-    # quick lookup: get first 50 playlists
-    results = sp.current_user_playlists(limit=50)
-    for pl in results["items"]:
-        if pl["name"] == name:
-            return pl["id"]
-    # not found -> create private
-    created = sp.user_playlist_create(me, name, public=False, description="Made with Swpify")
-    return created["id"]
-
-
-def add_to_playlist(sp: spotipy.Spotify, track_id: str, playlist_name: str):
+    me = me_id(sp)
+    # Resolved ids outlive the process-wide lookup cache (server restarts,
+    # its ttl), so a returning user never rescans their playlists.
+    pid = playlist_ids(me).get(name)
+    checked = st.session_state.setdefault(K.playlists_ok, set())
+    if pid and name not in checked:
+        # once per session, one cheap call: the user may have deleted (i.e.
+        # unfollowed) it in Spotify since, and adds to it would vanish
+        if playlist_followed(sp, me, pid):
+            checked.add(name)
+        else:
+            drop_playlist(sp, name)
+            pid = None
+    if pid:
+        return pid
+    pid = find_playlist_id(me, name, sp)
+    if not pid:
+        # not found -> create private
+        pid = sp_call(lambda: sp.user_playlist_create(me, name, public=False, description="Made with Swpify"))["id"]
+        # the cached lookup still says "missing"; drop it so other sessions find this one
+        find_playlist_id.clear(me, name, sp)
+    save_playlist_id(me, name, pid)
+    checked.add(name)
+    return pid
+
+
+def playlist_followed(sp: spotipy.Spotify, user_id: str, pid: str) -> bool:
+    try:
+        return bool(sp_call(lambda: sp.playlist_is_following(pid, [user_id]))[0])
+    except SpotifyException as e:
+        if e.http_status in (403, 404):
+            return False
+        raise
+
+
+def drop_playlist(sp: spotipy.Spotify, name: str):
+    # forget a dead id everywhere it's remembered, so the next lookup starts over
+    me = me_id(sp)
+    forget_playlist_id(me, name)
+    find_playlist_id.clear(me, name, sp)
+    st.session_state.get(K.playlists_ok, set()).discard(name)
+
+
+ADD_BATCH = 100      # ids per playlist_add_items call (endpoint maximum)
+UNLIKE_BATCH = 50    # ids per saved-tracks delete call (endpoint maximum)
+
+
+def add_to_playlist(sp: spotipy.Spotify, track_ids: List[str], playlist_name: str):
     pid = ensure_playlist(sp, playlist_name)
-    sp.playlist_add_items(pid, [track_id])
+    for i in range(0, len(track_ids), ADD_BATCH):
+        batch = track_ids[i:i + ADD_BATCH]
+        try:
+            sp_call(lambda: sp.playlist_add_items(pid, batch))
+        except SpotifyException as e:
+            if e.http_status not in (403, 404):
+                raise
+            # the remembered playlist is gone or no longer editable: resolve
+            # (or create) it again and retry once
+            drop_playlist(sp, playlist_name)
+            pid = ensure_playlist(sp, playlist_name)
+            sp_call(lambda: sp.playlist_add_items(pid, batch))
+
+
+def unlike_tracks(sp: spotipy.Spotify, track_ids: List[str]):
+    for i in range(0, len(track_ids), UNLIKE_BATCH):
+        sp_call(lambda: sp.current_user_saved_tracks_delete(track_ids[i:i + UNLIKE_BATCH]))
+    # the session's copy follows along, so the next rebuild stays incremental
+    known = st.session_state.get(K.library)
+    if known:
+        gone = set(track_ids)
+        items = [t for t in known["items"] if t["id"] not in gone]
+        st.session_state[K.library] = {"total": known["total"] - (len(known["items"]) - len(items)), "items": items}
+
+
+# Swipes queue their library writes; they are sent in batches instead of
+# one request per tap.
+FLUSH_AT = 25        # queued writes that trigger a sync
+FLUSH_SECS = 5.0     # ...or seconds since the last sync
+
+
+def pending_count() -> int:
+    pending = st.session_state[K.pending]
+    return len(pending["unlike"]) + sum(len(ids) for ids in pending["fav"].values())
+
+
+REFUSED = (400, 403, 404)  # Spotify turned the write itself down; resending won't help
+
+
+def _retryable(e: Exception) -> bool:
+    # Everything else may pass later: rate limits, server errors, network
+    # trouble, and 401 (a lapsed token, which the next spotify() refreshes).
+    return not (isinstance(e, SpotifyException) and e.http_status in REFUSED)
+
+
+def _drain(ids: List[str], size: int, send: Callable[[List[str]], None]) -> Tuple[int, bool]:
+    """Send `ids` in batches of `size`, removing each batch once it's handled.
+
+    A batch Spotify refuses (400, 403, 404) is dropped and counted;
+    one that may succeed later stops the drain and stays queued with the
+    rest. Returns (number dropped, whether it stopped early).
+    """
+    dropped = 0
+    while ids:
+        batch = ids[:size]
+        try:
+            send(batch)
+        except (SpotifyException, requests.RequestException) as e:
+            if _retryable(e):
+                return dropped, True
+            dropped += len(batch)
+        del ids[:size]
+    return dropped, False
+
+
+def flush_pending(sp: spotipy.Spotify):
+    # Each batch leaves the buffer only once Spotify has taken or refused it,
+    # so a retry never re-adds to a playlist and a bad one never blocks the
+    # rest. Every playlist and the unlikes drain independently.
+    pending = st.session_state[K.pending]
+    dropped, stalled = 0, False
+    try:
+        for name in list(pending["fav"]):
+            n, stuck = _drain(pending["fav"][name], ADD_BATCH, lambda ids: add_to_playlist(sp, ids, name))
+            dropped, stalled = dropped + n, stalled or stuck
+            if not pending["fav"][name]:
+                del pending["fav"][name]
+        n, stuck = _drain(pending["unlike"], UNLIKE_BATCH, lambda ids: unlike_tracks(sp, ids))
+        dropped, stalled = dropped + n, stalled or stuck
+        if dropped:
+            st.toast(f"Spotify refused {dropped} change(s); they were dropped. "
+                     "Check the favourites playlist name and that it's yours.", icon="⚠️")
+        if stalled:
+            st.toast(f"Couldn't sync {pending_count()} change(s) with Spotify; will retry.", icon="⚠️")
+    finally:
+        # stamped either way, so a failing sync retries every FLUSH_SECS, not every swipe
+        st.session_state[K.last_flush] = time.time()
+        # the saved copy must not replay writes that already landed
+        save_progress(me_id(sp))
 
 
-def unlike_track(sp: spotipy.Spotify, track_id: str):
-    sp.current_user_saved_tracks_delete([track_id])
+def maybe_flush(sp: spotipy.Spotify):
+    n = pending_count()
+    if n and (n >= FLUSH_AT or time.time() - st.session_state[K.last_flush] >= FLUSH_SECS):
+        flush_pending(sp)
 
 
 # --------------------------- UI Pieces --------------------------- #
+PRELOAD_AHEAD = 3    # upcoming covers the browser fetches while the current card is shown
+
+
 def header():
     # progress across entire library (not only filtered queue)
     total = max(1, st.session_state.get(K.total, 0))
@@ -194,7 +746,8 @@ def header():
 
 
 def controls(sp: Optional[spotipy.Spotify]):
-    with st.expander("Options", expanded=True):
+    # open until there is something to swipe, then out of the way
+    with st.expander("Options", expanded=not st.session_state[K.queue]):
         # compact toggle (default ON). Also rewrite query param so reopened links preserve state.
         col_t, col_toggle = st.columns([1, 1])
         with col_t:
@@ -212,32 +765,75 @@ def controls(sp: Optional[spotipy.Spotify]):
 
         # Build/Refresh queue
         if sp and st.button("Build / Refresh Queue", use_container_width=True):
-            all_liked = fetch_all_liked(sp)
+            # send queued unlikes first; any that fail are filtered out below
+            flush_pending(sp)
+            me = me_id(sp)
+            fingerprint = library_fingerprint(sp)
+            all_liked = cached_liked(me, fingerprint, sp, st.session_state.get(K.library))
+            # A failed flush leaves unlikes queued; they're still in Spotify
+            # but must not come back. The snapshot counts as if they'd landed,
+            # which is what Spotify's total will say once they do.
+            unsent = set(st.session_state[K.pending]["unlike"])
+            kept = [t for t in all_liked if t["id"] not in unsent] if unsent else all_liked
+            total = fingerprint[0] - (len(all_liked) - len(kept))
+            all_liked = kept
+            st.session_state[K.library] = {"total": total, "items": all_liked}
+            # one snapshot per user: every like/unlike is a new key, and the
+            # old full-library copy would otherwise stay on disk for good
+            prev = swap_library_fingerprint(me, fingerprint)
+            if prev and prev != fingerprint:
+                cached_liked.clear(me, prev, sp)
+            # store total size for progress (100% = all-time liked size)
+            st.session_state[K.total] = len(all_liked)
             start = parse_date(st.session_state[K.added_after])
             end   = parse_date(st.session_state[K.added_before])
 
-            def in_range(added_at: Optional[str]) -> bool:
-                if not added_at:
-                    return True
-                d = dt.datetime.fromisoformat(added_at.replace("Z", "+00:00")).date()
-                if start and d < start:
-                    return False
-                if end and d > end:
-                    return False
-                return True
-
-            filtered = [t for t in all_liked if in_range(t.get("added_at"))]
+            # added_at is ISO-8601 UTC, so its YYYY-MM-DD prefix orders like the
+            # date itself: bounds are formatted once, each track is a slice + compare.
+            lo = start.isoformat() if start else ""
+            hi = end.isoformat() if end else "9999-12-31"
+            filtered = [t for t in all_liked if not t.get("added_at") or lo <= t["added_at"][:10] <= hi]
             # Shuffle option could be added here if wanted
             # Reset queue + seen-set only for the filtered portion;
             # seen_ids persists to compute global progress.
-            st.session_state[K.queue] = filtered
+            st.session_state[K.queue] = deque(filtered)
+            st.session_state[K.queue_pos] = 0
+            save_queue(me)
             st.toast(f"Queue ready: {len(filtered)} song(s)", icon="🎵")
             st.rerun()
 
+        if sp and st.button("Force full library refresh", use_container_width=True):
+            me = me_id(sp)
+            cached_liked.clear(me, library_fingerprint(sp), sp)
+            st.session_state.pop(K.library, None)
+            st.toast("Library cache cleared; the next build re-fetches from Spotify.", icon="🔄")
+
         # Logout (clear token)
         if st.button("Log out (clear token)", use_container_width=True):
+            if sp:
+                flush_pending(sp)
             if K.token_info in st.session_state:
                 st.session_state.pop(K.token_info)
+            # next login may be a different account
+            st.session_state.pop(K.client, None)
+            st.session_state.pop(K.refresh, None)
+            st.session_state.pop(K.user_id, None)
+            st.session_state.pop(K.restored, None)
+            st.session_state.pop(K.playlists, None)
+            st.session_state.pop(K.playlists_ok, None)
+            st.session_state.pop(K.library, None)
+            # the queue and progress are this user's and already saved under
+            # their id; left in place they'd skip the next user's restore and
+            # be written over that user's progress file
+            st.session_state[K.queue] = deque()
+            st.session_state[K.queue_pos] = 0
+            st.session_state[K.seen_ids] = set()
+            st.session_state[K.total] = 0
+            # Writes a failed flush kept are in the old user's progress file and
+            # replay when they're back; kept here, the next login would send
+            # them with its own token.
+            st.session_state[K.pending] = {"fav": {}, "unlike": []}
+            st.session_state[K.last_flush] = 0.0
             st.success("Cleared token; please log in again.")
             st.rerun()
 
@@ -269,35 +865,74 @@ def card(track: Dict):
             st.link_button("🎧 Open in Spotify", track["url"], use_container_width=True)
 
 
-def actions_row(sp: spotipy.Spotify, track_id: str):
+def preload_next(queue: Deque[Dict]):
+    # Browser-side look-ahead: covers for the next cards download while the
+    # user is still deciding, so the following render paints from cache.
+    urls = [t["image"] for t in islice(queue, 1, 1 + PRELOAD_AHEAD) if t.get("image")]
+    if urls:
+        tags = "".join(f'<link rel="preload" as="image" href="{html.escape(u)}">' for u in urls)
+        st.markdown(tags, unsafe_allow_html=True)
+
+
+def actions_row(track_id: str):
     st.markdown('<div class="swpify-actions">', unsafe_allow_html=True)
     a, b, c = st.columns(3)
     with a:
-        if st.button("✅ Keep", use_container_width=True):
-            act_and_next("keep", sp, track_id)
+        st.button("✅ Keep", use_container_width=True, on_click=act_and_next, args=("keep", track_id))
     with b:
-        if st.button("⭐ Favourite", use_container_width=True):
-            act_and_next("fav", sp, track_id)
+        st.button("⭐ Favourite", use_container_width=True, on_click=act_and_next, args=("fav", track_id))
     with c:
-        if st.button("🗑️ Remove (unlike)", use_container_width=True):
-            act_and_next("rm", sp, track_id)
+        st.button("🗑️ Remove (unlike)", use_container_width=True, on_click=act_and_next, args=("rm", track_id))
     st.markdown("</div>", unsafe_allow_html=True)
 
 
-def act_and_next(action: str, sp: spotipy.Spotify, track_id: str):
+def act_and_next(action: str, track_id: str):
+    # Button callback: runs before the swipe panel redraws, so no st.rerun().
+    sp = spotify()
+    pending = st.session_state[K.pending]
     try:
         if action == "fav":
-            add_to_playlist(sp, track_id, st.session_state[K.favourites])
+            pending["fav"].setdefault(st.session_state[K.favourites], []).append(track_id)
         elif action == "rm":
-            unlike_track(sp, track_id)
+            pending["unlike"].append(track_id)
         # 'keep' does nothing with library but marks as processed
+        maybe_flush(sp)
     finally:
         st.session_state[K.swiped] += 1
         st.session_state[K.seen_ids].add(track_id)
         # advance queue if current is same head
         if st.session_state[K.queue] and st.session_state[K.queue][0]["id"] == track_id:
-            st.session_state[K.queue].pop(0)
-        st.rerun()
+            st.session_state[K.queue].popleft()
+            st.session_state[K.queue_pos] += 1
+        if not st.session_state[K.queue]:
+            flush_pending(sp)   # nothing left to swipe: don't leave writes behind
+        elif time.time() - st.session_state[K.last_save] >= FLUSH_SECS:
+            save_progress(me_id(sp))  # flushes save too; this covers runs of Keeps
+
+
+def sync_now():
+    flush_pending(spotify())
+
+
+@st.fragment
+def swipe_panel():
+    # A swipe reruns just this block (progress, card, actions), not the page.
+    q = st.session_state[K.queue]
+    if not q:
+        st.rerun()  # last card swiped: the page switches to the empty-queue view
+    header()
+
+    # Display current head of queue
+    current = q[0]
+    card(current)
+    actions_row(current["id"])
+    preload_next(q)
+
+    st.divider()
+    st.caption(f"Remaining in queue: **{len(q)}**")
+    n_pending = pending_count()
+    if n_pending:
+        st.button(f"🔄 Sync now ({n_pending} pending)", use_container_width=True, on_click=sync_now)
 
 
 def login_view(oauth: SpotifyOAuth):
@@ -311,28 +946,27 @@ def main():
     init_state()
 
     oauth = make_oauth()
-    sp = token_to_client()
+    sp = token_to_client(oauth)
 
     if not sp:
         login_view(oauth)
         return
 
-    header()
+    # cold session: pick up where this user left off
+    if not st.session_state.get(K.restored):
+        st.session_state[K.restored] = True
+        if not st.session_state[K.queue] and not st.session_state[K.seen_ids]:
+            restore_state(me_id(sp))
+
     controls(sp)
 
-    q = st.session_state[K.queue]
-    if not q:
+    if not st.session_state[K.queue]:
+        header()
         # Empty queue banner
         st.info(f"🎵 No queue yet — tap **Build / Refresh Queue** above. Total liked: {st.session_state.get(K.total, 0)}")
         return
 
-    # Display current head of queue
-    current = q[0]
-    card(current)
-    actions_row(sp, current["id"])
-
-    st.divider()
-    st.caption(f"Remaining in queue: **{len(q)}**")
+    swipe_panel()
 
 
 if __name__ == "__main__":